@@ -1,59 +1,314 @@
 import torch
 from diffusers.pipelines.glm_image import GlmImagePipeline
 from PIL import Image
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from pydantic import AfterValidator, BaseModel, Field
 import io
+import os
+import gzip
 import base64
+import hashlib
 import uvicorn
-from typing import List
+import asyncio
+import threading
+import itertools
+import anyio
+from anyio.lowlevel import RunVar
+from functools import partial
+from typing import Annotated, BinaryIO, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 # Global variable to store the pipeline
 pipe = None
 
+# Weight precision, set via GLM_DTYPE: bf16 (default), fp16, fp32 or fp8.
+# fp8 loads in bf16 and then quantizes the transformer weights with torchao.
+GLM_DTYPE = os.environ.get("GLM_DTYPE", "bf16").lower()
+TORCH_DTYPES = {
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+    "fp32": torch.float32,
+    "fp8": torch.bfloat16,
+}
+
+# Default number of inference steps. The model's own flow-matching scheduler is kept:
+# GlmImagePipeline always passes explicit sigmas and a dynamic-shift mu to
+# scheduler.set_timesteps, which DPM-Solver/UniPC do not accept.
+DEFAULT_STEPS = 50
+
+# CUDA caching allocator settings; expandable segments avoid fragmentation when
+# height/width change between requests. Must be set before the first CUDA allocation.
+CUDA_ALLOC_CONF = "expandable_segments:True,max_split_size_mb:512"
+GPU_MEMORY_FRACTION = 0.9
+
+# Memory savings for large resolutions. AutoencoderKL tiles as soon as a side exceeds
+# vae.config.sample_size, which can include the default presets, so tiled VAE decoding
+# (GLM_VAE_TILING, on by default) is switched on per call only when a side is larger than
+# VAE_TILING_MIN_SIZE; smaller images keep the single-pass, seam-free decoder.
+# Attention slicing (GLM_ATTENTION_SLICING) and xFormers attention (GLM_XFORMERS) trade
+# speed for memory and are off by default.
+GLM_VAE_TILING = os.environ.get("GLM_VAE_TILING", "1") == "1"
+GLM_ATTENTION_SLICING = os.environ.get("GLM_ATTENTION_SLICING", "0") == "1"
+GLM_XFORMERS = os.environ.get("GLM_XFORMERS", "0") == "1"
+VAE_TILING_MIN_SIZE = 1536
+# Set by enable_memory_savings when the VAE supports tiling
+vae_tiling_supported = False
+
+# torch.compile the transformer and VAE decoder; opt in with GLM_COMPILE=1.
+# CUDA graphs ("reduce-overhead") are not used: the GLM transformer keeps a mutable
+# kv_caches object across calls in image-to-image mode, which graph replay cannot handle.
+# Latent height/width and the text sequence length (which grows with quoted glyph text in
+# the prompt) vary per request, so shapes are compiled as dynamic instead of recompiling
+# for each new size or prompt; COMPILE_CACHE_SIZE bounds the remaining guard-driven variants.
+GLM_COMPILE = os.environ.get("GLM_COMPILE", "0") == "1"
+COMPILE_MODE = "default"
+COMPILE_CACHE_SIZE = 16
+
+# (height, width) presets used by the UI, generated once at startup to warm up the allocator
+# and trigger compilation before the first request
+WARMUP_SIZES = [(32 * 32, 36 * 32), (33 * 32, 32 * 32)]
+WARMUP_STEPS = 2
+
+# Output image encoding
+IMAGE_FORMAT = "WEBP"
+IMAGE_MEDIA_TYPE = "image/webp"
+IMAGE_QUALITY = 90
+
+# Maximum number of worker threads for blocking calls (host copies, image encoding)
+THREAD_LIMIT = 16
+
+# Single thread that runs every pipeline call, warm-up included, created in lifespan.
+# Compiled code and CUDA state are per-thread, so keeping all GPU work on one thread
+# lets requests reuse what the warm-up prepared.
+gpu_executor: Optional[ThreadPoolExecutor] = None
+
+# Worker threads for decoding uploads; the pool lives on app.state and is created in lifespan
+DECODE_WORKERS = 8
+
+# The pipeline is not thread-safe (scheduler state), so GPU work is serialized
+pipe_lock = threading.Lock()
+
+# Pool of CUDA generators, created in lifespan and only used while holding pipe_lock
+generators: List[torch.Generator] = []
+
+# Encoded text-to-image results keyed on all generation parameters, so repeated
+# requests with a fixed seed return instantly. Requests with a random seed are not cached.
+RESULT_CACHE_SIZE = 64
+result_cache: "OrderedDict[str, bytes]" = OrderedDict()
+result_cache_lock = threading.Lock()
+# Generations currently running for a cache key, so concurrent identical requests share one
+result_inflight: "dict[str, asyncio.Task]" = {}
+
+# Side streams for copying results to the host, created in lifespan and cycled through
+COPY_STREAM_COUNT = 2
+copy_streams: Optional[Iterator[torch.cuda.Stream]] = None
+
 def load_model():
     """Load the GLM-Image model"""
     global pipe
-    print("Loading GLM-Image model...")
+    if GLM_DTYPE not in TORCH_DTYPES:
+        raise ValueError(f"Unsupported GLM_DTYPE '{GLM_DTYPE}', expected one of: {', '.join(TORCH_DTYPES)}")
+    
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", CUDA_ALLOC_CONF)
+    torch.cuda.set_per_process_memory_fraction(GPU_MEMORY_FRACTION)
+    
+    print(f"Loading GLM-Image model ({GLM_DTYPE})...")
     pipe = GlmImagePipeline.from_pretrained(
         "zai-org/GLM-Image",
+        torch_dtype=TORCH_DTYPES[GLM_DTYPE],
         device_map="cuda"
     )
+    if GLM_DTYPE == "fp8":
+        quantize_transformer_fp8(pipe)
+    enable_memory_savings(pipe)
+    if GLM_COMPILE:
+        compile_model(pipe)
     print("Model loaded successfully!")
     return pipe
 
+def warmup_model():
+    """Run a short generation for each preset size so the caching allocator keeps its blocks.
+    
+    torch.cuda.empty_cache() is deliberately not called afterwards, so the segments stay reserved.
+    """
+    for height, width in WARMUP_SIZES:
+        print(f"Warming up at {height}x{width}...")
+        try:
+            text_to_image("warmup", height=height, width=width, num_inference_steps=WARMUP_STEPS, seed=0)
+        except HTTPException as e:
+            print(f"Warm-up failed at {height}x{width}: {e.detail}")
+    print("Warm-up finished!")
+
+def quantize_transformer_fp8(pipe):
+    """Quantize the transformer linear weights to FP8; the VAE stays in bf16 to avoid decoder artifacts"""
+    try:
+        from torchao.quantization import quantize_, Float8WeightOnlyConfig
+    except ImportError:
+        print("torchao is not installed, keeping transformer weights in bf16")
+        return
+    quantize_(pipe.transformer, Float8WeightOnlyConfig())
+    print("Transformer weights quantized to FP8")
+
+def enable_memory_savings(pipe):
+    """Reduce peak VRAM at high resolutions; options the pipeline does not support are skipped"""
+    global vae_tiling_supported
+    if GLM_VAE_TILING:
+        try:
+            # Check support now; tiling is switched on per call by configure_vae_tiling
+            pipe.vae.enable_tiling()
+            pipe.vae.disable_tiling()
+            vae_tiling_supported = True
+            print(f"VAE tiled decoding enabled above {VAE_TILING_MIN_SIZE}px")
+        except Exception as e:
+            print(f"VAE tiling is not supported: {e}")
+    if GLM_ATTENTION_SLICING:
+        try:
+            pipe.enable_attention_slicing("auto")
+            print("Attention slicing enabled")
+        except Exception as e:
+            print(f"Attention slicing is not supported: {e}")
+    if GLM_XFORMERS:
+        try:
+            pipe.enable_xformers_memory_efficient_attention()
+            print("xFormers memory efficient attention enabled")
+        except Exception as e:
+            print(f"xFormers attention is not available: {e}")
+
+def configure_vae_tiling(height: int, width: int):
+    """Use tiled VAE decoding only for large outputs; must be called while holding pipe_lock"""
+    if not vae_tiling_supported:
+        return
+    if max(height, width) > VAE_TILING_MIN_SIZE:
+        pipe.vae.enable_tiling()
+    else:
+        pipe.vae.disable_tiling()
+
+def compile_model(pipe):
+    """Compile the transformer and VAE decoder with dynamic shapes; compilation happens lazily on the first call"""
+    torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, COMPILE_CACHE_SIZE)
+    pipe.transformer = torch.compile(pipe.transformer, mode=COMPILE_MODE, fullgraph=False, dynamic=True)
+    pipe.vae.decode = torch.compile(pipe.vae.decode, mode=COMPILE_MODE, fullgraph=False, dynamic=True)
+    print(f"Transformer and VAE decoder compiled (mode={COMPILE_MODE})")
+
+async def run_on_gpu_thread(func, *args, **kwargs):
+    """Run a blocking function on the dedicated GPU thread"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(gpu_executor, partial(func, *args, **kwargs))
+
+def autocast_context():
+    """Autocast activations to the pipeline dtype (disabled for fp32)"""
+    dtype = TORCH_DTYPES.get(GLM_DTYPE, torch.bfloat16)
+    return torch.autocast("cuda", dtype=dtype, enabled=dtype != torch.float32)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan event handler for startup and shutdown"""
-    # Startup: Load model
-    load_model()
+    global gpu_executor
+    # Startup: Load model on the GPU thread and warm it up
+    RunVar("_default_thread_limiter").set(anyio.CapacityLimiter(THREAD_LIMIT))
+    app.state.pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+    gpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpu")
+    await run_on_gpu_thread(load_model)
+    await run_on_gpu_thread(init_generators)
+    await run_on_gpu_thread(init_copy_streams)
+    await run_on_gpu_thread(warmup_model)
     yield
-    # Shutdown: Cleanup (if needed)
-    # Currently no cleanup needed
+    # Shutdown: Stop the decode pool and the GPU thread
+    app.state.pool.shutdown(wait=False)
+    gpu_executor.shutdown(wait=False)
+    gpu_executor = None
 
 app = FastAPI(title="GLM-Image Web UI", lifespan=lifespan)
 
+# Accepted image sizes; dimensions are snapped down to a multiple of SIZE_MULTIPLE
+# (VAE downsampling x patch size) before any GPU work is done
+MIN_SIZE = 256
+MAX_SIZE = 2048
+SIZE_MULTIPLE = 32
+MAX_STEPS = 100
+
+def snap_size(value: int) -> int:
+    """Round an image dimension down to a multiple of SIZE_MULTIPLE"""
+    return (value // SIZE_MULTIPLE) * SIZE_MULTIPLE
+
+# Validated as int first, then snapped, then range-checked
+ImageSize = Annotated[int, AfterValidator(snap_size), Field(ge=MIN_SIZE, le=MAX_SIZE)]
+
 # Pydantic models for request validation
 class TextToImageRequest(BaseModel):
     prompt: str
-    height: int = 32 * 32
-    width: int = 36 * 32
-    num_inference_steps: int = 50
+    height: ImageSize = 32 * 32
+    width: ImageSize = 36 * 32
+    num_inference_steps: int = Field(DEFAULT_STEPS, ge=1, le=MAX_STEPS)
     guidance_scale: float = 1.5
     seed: int = 42
 
 
-def text_to_image(
+def init_generators(count: int = 1):
+    """Pre-create the pool of CUDA generators reused across requests"""
+    global generators
+    generators = [torch.Generator(device="cuda") for _ in range(count)]
+
+def seed_generators(seeds: List[int]) -> List[torch.Generator]:
+    """Seed pooled generators for one pipeline call, randomly when seed is negative.
+    
+    Must be called while holding pipe_lock, which keeps at most one call's generators in use.
+    """
+    while len(generators) < len(seeds):
+        generators.append(torch.Generator(device="cuda"))
+    for generator, seed in zip(generators, seeds):
+        if seed >= 0:
+            generator.manual_seed(seed)
+        else:
+            generator.seed()
+    return generators[:len(seeds)]
+
+def init_copy_streams(count: int = COPY_STREAM_COUNT):
+    """Create the side streams used for device-to-host result copies"""
+    global copy_streams
+    copy_streams = itertools.cycle([torch.cuda.Stream() for _ in range(count)])
+
+def copy_to_host(images: torch.Tensor) -> Tuple[torch.Tensor, Optional[torch.cuda.Event]]:
+    """Start copying pipeline output in [0, 1] to pinned host memory as uint8 HWC.
+    
+    The uint8 conversion happens on the GPU; the copy is issued on a side stream so it
+    overlaps with the next pipeline call on the GPU thread. Must be called while holding pipe_lock.
+    """
+    if images.dim() == 3:
+        images = images.unsqueeze(0)
+    images_u8 = (images * 255).round().clamp(0, 255).to(torch.uint8).permute(0, 2, 3, 1).contiguous()
+    if not images_u8.is_cuda:
+        return images_u8, None
+    
+    pinned = torch.empty(images_u8.shape, dtype=torch.uint8, pin_memory=True)
+    stream = next(copy_streams) if copy_streams is not None else torch.cuda.current_stream()
+    stream.wait_stream(torch.cuda.current_stream())
+    with torch.cuda.stream(stream):
+        pinned.copy_(images_u8, non_blocking=True)
+        images_u8.record_stream(stream)
+        event = stream.record_event()
+    return pinned, event
+
+def host_to_images(pinned: torch.Tensor, event: Optional[torch.cuda.Event]) -> List[Image.Image]:
+    """Wait for a copy started by copy_to_host and wrap the host buffer as PIL Images without copying"""
+    if event is not None:
+        event.synchronize()
+    array = pinned.numpy()
+    height, width = array.shape[1:3]
+    return [Image.frombuffer("RGB", (width, height), array[i], "raw", "RGB", 0, 1) for i in range(len(array))]
+
+def start_text_to_image(
     prompt: str,
     height: int = 32 * 32,
     width: int = 36 * 32,
-    num_inference_steps: int = 50,
+    num_inference_steps: int = DEFAULT_STEPS,
     guidance_scale: float = 1.5,
     seed: int = 42
-):
-    """Generate image from text prompt"""
+) -> Tuple[torch.Tensor, Optional[torch.cuda.Event]]:
+    """Generate image from text prompt and start copying it to the host; finish with host_to_images"""
     global pipe
     try:
         # Validate inputs
@@ -63,38 +318,79 @@ def text_to_image(
         if pipe is None:
             raise HTTPException(status_code=503, detail="Model is not loaded yet. Please wait for the model to finish loading.")
         
-        # Set up generator with seed
-        generator = torch.Generator(device="cuda").manual_seed(seed) if seed >= 0 else None
-        
         # Generate image
         print(f"Generating image with prompt: {prompt}")
-        result = pipe(
-            prompt=prompt,
-            height=height,
-            width=width,
-            num_inference_steps=num_inference_steps,
-            guidance_scale=guidance_scale,
-            generator=generator,
-        )
-        
-        image = result.images[0]
-        return image
+        with pipe_lock, autocast_context():
+            configure_vae_tiling(height, width)
+            # Set up generator with seed
+            generator = seed_generators([seed])[0]
+            result = pipe(
+                prompt=prompt,
+                height=height,
+                width=width,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+                generator=generator,
+                output_type="pt",
+            )
+            return copy_to_host(result.images)
     
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Error generating image: {str(e)}"
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
-def image_to_image(
+def text_to_image(
+    prompt: str,
+    height: int = 32 * 32,
+    width: int = 36 * 32,
+    num_inference_steps: int = DEFAULT_STEPS,
+    guidance_scale: float = 1.5,
+    seed: int = 42
+):
+    """Generate image from text prompt"""
+    host_images = start_text_to_image(prompt, height, width, num_inference_steps, guidance_scale, seed)
+    return host_to_images(*host_images)[0]
+
+async def run_text_to_image(
+    prompt: str,
+    height: int,
+    width: int,
+    num_inference_steps: int,
+    guidance_scale: float,
+    seed: int
+) -> bytes:
+    """Generate an image on the GPU thread and return it encoded.
+    
+    Each request is its own pipeline call: GlmImagePipeline seeds its autoregressive prior
+    stage from the first generator of a batch, so distinct requests cannot share a call
+    and stay reproducible. Waiting for the host copy and encoding happen on worker threads,
+    so the GPU thread can start on the next request right away.
+    """
+    host_images = await run_on_gpu_thread(
+        start_text_to_image,
+        prompt=prompt,
+        height=height,
+        width=width,
+        num_inference_steps=num_inference_steps,
+        guidance_scale=guidance_scale,
+        seed=seed
+    )
+    images = await anyio.to_thread.run_sync(host_to_images, *host_images)
+    return await anyio.to_thread.run_sync(image_to_bytes, images[0])
+
+def start_image_to_image(
     images: List[Image.Image],
     prompt: str,
     height: int = 33 * 32,
     width: int = 32 * 32,
-    num_inference_steps: int = 50,
+    num_inference_steps: int = DEFAULT_STEPS,
     guidance_scale: float = 1.5,
     seed: int = 42
-):
-    """Generate image from input images and prompt"""
+) -> Tuple[torch.Tensor, Optional[torch.cuda.Event]]:
+    """Generate image from input images and prompt and start copying it to the host; finish with host_to_images"""
     global pipe
     try:
         # Validate inputs
@@ -107,40 +403,55 @@ def image_to_image(
         if pipe is None:
             raise HTTPException(status_code=503, detail="Model is not loaded yet. Please wait for the model to finish loading.")
         
-        # Set up generator with seed
-        generator = torch.Generator(device="cuda").manual_seed(seed) if seed >= 0 else None
-        
         # Generate image
         print(f"Generating image with prompt: {prompt} and {len(images)} input image(s)")
-        result = pipe(
-            prompt=prompt,
-            image=images,  # Can input multiple images
-            height=height,
-            width=width,
-            num_inference_steps=num_inference_steps,
-            guidance_scale=guidance_scale,
-            generator=generator,
-        )
-        
-        image = result.images[0]
-        return image
+        with pipe_lock, autocast_context():
+            configure_vae_tiling(height, width)
+            # Set up generator with seed
+            generator = seed_generators([seed])[0]
+            result = pipe(
+                prompt=prompt,
+                image=images,  # Can input multiple images
+                height=height,
+                width=width,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+                generator=generator,
+                output_type="pt",
+            )
+            return copy_to_host(result.images)
     
     except Exception as e:
         error_msg = f"Error generating image: {str(e)}"
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
-def image_to_base64(image: Image.Image) -> str:
-    """Convert PIL Image to base64 string"""
+def image_to_image(
+    images: List[Image.Image],
+    prompt: str,
+    height: int = 33 * 32,
+    width: int = 32 * 32,
+    num_inference_steps: int = DEFAULT_STEPS,
+    guidance_scale: float = 1.5,
+    seed: int = 42
+):
+    """Generate image from input images and prompt"""
+    host_images = start_image_to_image(images, prompt, height, width, num_inference_steps, guidance_scale, seed)
+    return host_to_images(*host_images)[0]
+
+def image_to_bytes(image: Image.Image) -> bytes:
+    """Encode PIL Image as WebP (much faster to encode and smaller than PNG)"""
     buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
+    image.save(buffered, format=IMAGE_FORMAT, quality=IMAGE_QUALITY, method=4)
+    return buffered.getvalue()
 
-@app.get("/", response_class=HTMLResponse)
-async def read_root():
-    """Serve the main HTML page"""
-    html_content = """
+def bytes_to_base64(image_bytes: bytes) -> str:
+    """Convert encoded image bytes to a base64 data URL"""
+    img_str = base64.b64encode(image_bytes).decode()
+    return f"data:{IMAGE_MEDIA_TYPE};base64,{img_str}"
+
+# Main HTML page
+HTML_CONTENT = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -560,7 +871,7 @@ async def read_root():
                                     <label for="t2i-height">Height</label>
                                     <span id="t2i-height-value">1024</span>
                                 </div>
-                                <input type="range" id="t2i-height" name="height" min="32" max="2048" value="1024" step="32">
+                                <input type="range" id="t2i-height" name="height" min="256" max="2048" value="1024" step="32">
                             </div>
                             
                             <div class="slider-container">
@@ -568,7 +879,7 @@ async def read_root():
                                     <label for="t2i-width">Width</label>
                                     <span id="t2i-width-value">1152</span>
                                 </div>
-                                <input type="range" id="t2i-width" name="width" min="32" max="2048" value="1152" step="32">
+                                <input type="range" id="t2i-width" name="width" min="256" max="2048" value="1152" step="32">
                             </div>
                         </div>
                         
@@ -576,9 +887,9 @@ async def read_root():
                             <div class="slider-container">
                                 <div class="slider-value">
                                     <label for="t2i-steps">Inference Steps</label>
-                                    <span id="t2i-steps-value">50</span>
+                                    <span id="t2i-steps-value">__DEFAULT_STEPS__</span>
                                 </div>
-                                <input type="range" id="t2i-steps" name="steps" min="10" max="100" value="50" step="1">
+                                <input type="range" id="t2i-steps" name="steps" min="10" max="__MAX_STEPS__" value="__DEFAULT_STEPS__" step="1">
                             </div>
                             
                             <div class="slider-container">
@@ -607,7 +918,7 @@ async def read_root():
                     <div id="t2i-result" class="result-container" style="display: none;">
                         <h3>Generated Image</h3>
                         <img id="t2i-image" class="result-image" alt="Generated image">
-                        <a id="t2i-download" class="download-btn" download="output_t2i.png">Download Image</a>
+                        <a id="t2i-download" class="download-btn" download="output_t2i.webp">Download Image</a>
                     </div>
                 </div>
             </div>
@@ -648,7 +959,7 @@ async def read_root():
                                     <label for="i2i-height">Height</label>
                                     <span id="i2i-height-value">1056</span>
                                 </div>
-                                <input type="range" id="i2i-height" name="height" min="32" max="2048" value="1056" step="32">
+                                <input type="range" id="i2i-height" name="height" min="256" max="2048" value="1056" step="32">
                             </div>
                             
                             <div class="slider-container">
@@ -656,7 +967,7 @@ async def read_root():
                                     <label for="i2i-width">Width</label>
                                     <span id="i2i-width-value">1024</span>
                                 </div>
-                                <input type="range" id="i2i-width" name="width" min="32" max="2048" value="1024" step="32">
+                                <input type="range" id="i2i-width" name="width" min="256" max="2048" value="1024" step="32">
                             </div>
                         </div>
                         
@@ -664,9 +975,9 @@ async def read_root():
                             <div class="slider-container">
                                 <div class="slider-value">
                                     <label for="i2i-steps">Inference Steps</label>
-                                    <span id="i2i-steps-value">50</span>
+                                    <span id="i2i-steps-value">__DEFAULT_STEPS__</span>
                                 </div>
-                                <input type="range" id="i2i-steps" name="steps" min="10" max="100" value="50" step="1">
+                                <input type="range" id="i2i-steps" name="steps" min="10" max="__MAX_STEPS__" value="__DEFAULT_STEPS__" step="1">
                             </div>
                             
                             <div class="slider-container">
@@ -695,7 +1006,7 @@ async def read_root():
                     <div id="i2i-result" class="result-container" style="display: none;">
                         <h3>Generated Image</h3>
                         <img id="i2i-image" class="result-image" alt="Generated image">
-                        <a id="i2i-download" class="download-btn" download="output_i2i.png">Download Image</a>
+                        <a id="i2i-download" class="download-btn" download="output_i2i.webp">Download Image</a>
                     </div>
                 </div>
             </div>
@@ -842,7 +1153,7 @@ async def read_root():
             try {
                 const response = await fetch('/api/text-to-image', {
                     method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
+                    headers: { 'Content-Type': 'application/json', 'Accept': 'image/webp' },
                     body: JSON.stringify(formData)
                 });
                 
@@ -851,12 +1162,17 @@ async def read_root():
                     throw new Error(error.detail || 'Generation failed');
                 }
                 
-                const data = await response.json();
+                const blob = await response.blob();
                 const totalTime = (Date.now() - startTime) / 1000;
                 clearInterval(timerInterval);
                 
-                image.src = data.image;
-                download.href = data.image;
+                // Release the previous result before showing the new one
+                if (image.src.startsWith('blob:')) {
+                    URL.revokeObjectURL(image.src);
+                }
+                const imageUrl = URL.createObjectURL(blob);
+                image.src = imageUrl;
+                download.href = imageUrl;
                 result.style.display = 'block';
                 status.className = 'status success';
                 status.textContent = `Image generated successfully! (Time: ${formatTime(totalTime)})`;
@@ -915,6 +1231,7 @@ async def read_root():
             try {
                 const response = await fetch('/api/image-to-image', {
                     method: 'POST',
+                    headers: { 'Accept': 'image/webp' },
                     body: formData
                 });
                 
@@ -923,12 +1240,17 @@ async def read_root():
                     throw new Error(error.detail || 'Generation failed');
                 }
                 
-                const data = await response.json();
+                const blob = await response.blob();
                 const totalTime = (Date.now() - startTime) / 1000;
                 clearInterval(timerInterval);
                 
-                image.src = data.image;
-                download.href = data.image;
+                // Release the previous result before showing the new one
+                if (image.src.startsWith('blob:')) {
+                    URL.revokeObjectURL(image.src);
+                }
+                const imageUrl = URL.createObjectURL(blob);
+                image.src = imageUrl;
+                download.href = imageUrl;
                 result.style.display = 'block';
                 status.className = 'status success';
                 status.textContent = `Image generated successfully! (Time: ${formatTime(totalTime)})`;
@@ -945,49 +1267,154 @@ async def read_root():
     </script>
 </body>
 </html>
-    """
-    return html_content
+"""
+
+# Fill in the step slider defaults so they follow the API defaults
+HTML_CONTENT = HTML_CONTENT.replace("__DEFAULT_STEPS__", str(DEFAULT_STEPS)).replace("__MAX_STEPS__", str(MAX_STEPS))
+
+# The page is static, so encode, compress and hash it once at import
+HTML_BYTES = HTML_CONTENT.encode("utf-8")
+HTML_GZIP = gzip.compress(HTML_BYTES, compresslevel=9)
+HTML_DIGEST = hashlib.blake2b(HTML_BYTES, digest_size=16).hexdigest()
+# The gzip and identity bodies differ, so each gets its own strong ETag
+HTML_ETAG = f'"{HTML_DIGEST}"'
+HTML_GZIP_ETAG = f'"{HTML_DIGEST}-gz"'
+HTML_HEADERS = {
+    "Cache-Control": "public, max-age=3600",
+    "Vary": "Accept-Encoding",
+}
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag, using weak comparison as required for GET"""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+@app.get("/", response_class=HTMLResponse)
+async def read_root(request: Request):
+    """Serve the main HTML page"""
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    etag = HTML_GZIP_ETAG if use_gzip else HTML_ETAG
+    headers = {**HTML_HEADERS, "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        return Response(
+            content=HTML_GZIP,
+            media_type="text/html",
+            headers={**headers, "Content-Encoding": "gzip"}
+        )
+    return HTMLResponse(content=HTML_BYTES, headers=headers)
+
+def result_cache_key(request: TextToImageRequest) -> str:
+    """Hash the parameters that fully determine a text-to-image result"""
+    params = f"{request.prompt}|{request.height}|{request.width}|{request.num_inference_steps}|{request.guidance_scale}|{request.seed}"
+    return hashlib.blake2b(params.encode("utf-8"), digest_size=16).hexdigest()
+
+async def generate_text_to_image(request: TextToImageRequest) -> bytes:
+    """Run a text-to-image request and return the encoded image"""
+    if pipe is None:
+        raise HTTPException(status_code=503, detail="Model is not loaded yet. Please wait for the model to finish loading.")
+    
+    key = result_cache_key(request) if request.seed >= 0 else None
+    submit = partial(
+        run_text_to_image,
+        prompt=request.prompt,
+        height=request.height,
+        width=request.width,
+        num_inference_steps=request.num_inference_steps,
+        guidance_scale=request.guidance_scale,
+        seed=request.seed
+    )
+    if key is None:
+        return await submit()
+    
+    with result_cache_lock:
+        if key in result_cache:
+            result_cache.move_to_end(key)
+            return result_cache[key]
+    
+    task = result_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(submit())
+        result_inflight[key] = task
+        task.add_done_callback(partial(finish_inflight, key))
+    # Shield so a disconnecting client does not cancel the generation for the others
+    return await asyncio.shield(task)
+
+def finish_inflight(key: str, task: asyncio.Task):
+    """Store a finished generation in the result cache and stop tracking it as in flight"""
+    result_inflight.pop(key, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+    with result_cache_lock:
+        result_cache[key] = task.result()
+        if len(result_cache) > RESULT_CACHE_SIZE:
+            result_cache.popitem(last=False)
+
+def image_response(image_bytes: bytes, http_request: Request) -> Response:
+    """Return raw image bytes if the client accepts images, otherwise base64 in JSON"""
+    if "image/" in http_request.headers.get("accept", ""):
+        return Response(content=image_bytes, media_type=IMAGE_MEDIA_TYPE)
+    return JSONResponse(content={"image": bytes_to_base64(image_bytes), "status": "success"})
 
 @app.post("/api/text-to-image")
-async def api_text_to_image(request: TextToImageRequest):
+async def api_text_to_image(request: TextToImageRequest, http_request: Request):
     """API endpoint for text-to-image generation"""
     try:
-        image = text_to_image(
-            prompt=request.prompt,
-            height=request.height,
-            width=request.width,
-            num_inference_steps=request.num_inference_steps,
-            guidance_scale=request.guidance_scale,
-            seed=request.seed
-        )
-        image_base64 = image_to_base64(image)
-        return JSONResponse(content={"image": image_base64, "status": "success"})
+        image_bytes = await generate_text_to_image(request)
+        return image_response(image_bytes, http_request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/text-to-image/raw")
+async def api_text_to_image_raw(request: TextToImageRequest):
+    """API endpoint for text-to-image generation returning the encoded image bytes"""
+    try:
+        image_bytes = await generate_text_to_image(request)
+        return Response(content=image_bytes, media_type=IMAGE_MEDIA_TYPE)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def decode_image(file: BinaryIO) -> Image.Image:
+    """Decode an uploaded image file to an RGB PIL Image"""
+    file.seek(0)
+    return Image.open(file).convert("RGB")
+
+async def decode_upload(file: UploadFile) -> Image.Image:
+    """Decode an uploaded file on the decode pool, reading straight from its spooled buffer"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(app.state.pool, decode_image, file.file)
+
 @app.post("/api/image-to-image")
 async def api_image_to_image(
+    http_request: Request,
     files: List[UploadFile] = File(...),
     prompt: str = Form(...),
-    height: int = Form(1056),
-    width: int = Form(1024),
-    num_inference_steps: int = Form(50),
+    height: Annotated[ImageSize, Form()] = 1056,
+    width: Annotated[ImageSize, Form()] = 1024,
+    num_inference_steps: int = Form(DEFAULT_STEPS, ge=1, le=MAX_STEPS),
     guidance_scale: float = Form(1.5),
     seed: int = Form(42)
 ):
     """API endpoint for image-to-image generation"""
     try:
-        # Process uploaded files
-        pil_images = []
-        for file in files:
-            contents = await file.read()
-            img = Image.open(io.BytesIO(contents)).convert("RGB")
-            pil_images.append(img)
-        
-        image = image_to_image(
-            images=pil_images,
+        # Decode uploaded files concurrently on the decode pool
+        pil_images = await asyncio.gather(*[decode_upload(file) for file in files])
+        
+        host_images = await run_on_gpu_thread(
+            start_image_to_image,
+            images=list(pil_images),
             prompt=prompt,
             height=height,
             width=width,
@@ -995,8 +1422,10 @@ async def api_image_to_image(
             guidance_scale=guidance_scale,
             seed=seed
         )
-        image_base64 = image_to_base64(image)
-        return JSONResponse(content={"image": image_base64, "status": "success"})
+        # Wait for the host copy off the GPU thread so the next call can start right away
+        images = await anyio.to_thread.run_sync(host_to_images, *host_images)
+        image_bytes = await anyio.to_thread.run_sync(image_to_bytes, images[0])
+        return image_response(image_bytes, http_request)
     except HTTPException:
         raise
     except Exception as e: